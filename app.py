@@ -11,19 +11,26 @@ import trimesh
 import hashlib
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Dict, Any, Tuple, Optional
-import pandas as pd
+from typing import List, Dict, Any, Tuple, Optional, Callable
 import plotly.graph_objects as go
 import plotly.express as px
-from sklearn.neighbors import NearestNeighbors
+from scipy.spatial import cKDTree
+from scipy.spatial.distance import cdist
 import warnings
-import tempfile
 import re
 from collections import defaultdict
 import json
 import base64
 from io import BytesIO
 import zipfile
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
 
 warnings.filterwarnings('ignore')
 
@@ -73,6 +80,89 @@ if 'teacher_model' not in st.session_state:
 if 'student_models' not in st.session_state:
     st.session_state.student_models = {}
 
+def _reduce_stats_kernel(d: np.ndarray) -> Tuple[float, float, float, float]:
+    """Single-pass mean/max/std/sum-of-squares using Welford's algorithm"""
+    # Seed from the first element: fastmath assumes no infinities, so a
+    # -inf sentinel for the running max is not safe here
+    mean = np.float64(d[0])
+    maxv = mean
+    m2 = 0.0
+    sumsq = mean * mean
+    for i in range(1, d.size):
+        x = float(d[i])
+        delta = x - mean
+        mean += delta / (i + 1)
+        m2 += delta * (x - mean)
+        sumsq += x * x
+        if x > maxv:
+            maxv = x
+    return mean, maxv, np.sqrt(m2 / d.size), sumsq
+
+
+def _reduce_stats_numpy(d: np.ndarray) -> Tuple[float, float, float, float]:
+    """NumPy fallback for _reduce_stats when numba is not installed"""
+    return float(np.mean(d)), float(np.max(d)), float(np.std(d)), float(np.dot(d, d))
+
+
+if NUMBA_AVAILABLE:
+    _reduce_stats = njit(cache=True, fastmath=True)(_reduce_stats_kernel)
+else:
+    _reduce_stats = _reduce_stats_numpy
+
+
+def build_kdtree(points: np.ndarray) -> cKDTree:
+    """Build a kd-tree over a contiguous float32 point cloud"""
+    points = np.ascontiguousarray(points, dtype=np.float32)
+    return cKDTree(points, balanced_tree=True, compact_nodes=True)
+
+
+def _mesh_cached(mesh: trimesh.Trimesh, key: str, compute: Callable[[], Any]) -> Any:
+    """Memoize a derived value in trimesh's per-mesh cache
+    
+    This is the only access to trimesh's private ``_cache``, which trimesh
+    clears whenever the mesh geometry changes. If a trimesh release removes
+    or changes it, the value is recomputed on every call instead.
+    """
+    cache = getattr(mesh, '_cache', None)
+    try:
+        value = cache[key] if cache is not None else None
+    except (KeyError, TypeError, AttributeError):
+        cache, value = None, None
+    
+    if value is None:
+        value = compute()
+        if cache is not None:
+            try:
+                cache[key] = value
+            except (TypeError, AttributeError):
+                pass
+    return value
+
+
+def _face_area_cdf(mesh: trimesh.Trimesh) -> np.ndarray:
+    """Cumulative face areas, cached on the mesh so it is built once"""
+    return _mesh_cached(mesh, 'face_area_cdf', lambda: np.cumsum(mesh.area_faces))
+
+
+def _sample_surface(mesh: trimesh.Trimesh, num_points: int,
+                    rng: np.random.Generator) -> np.ndarray:
+    """Area-weighted uniform surface sampling using the cached face CDF"""
+    cdf = _face_area_cdf(mesh)
+    face_idx = np.searchsorted(cdf, rng.random(num_points) * cdf[-1])
+    face_idx = np.minimum(face_idx, len(cdf) - 1)
+    
+    # Uniform barycentric coordinates, folding points outside the triangle back in
+    uv = rng.random((num_points, 2))
+    outside = uv.sum(axis=1) > 1
+    uv[outside] = 1 - uv[outside]
+    
+    tri = mesh.vertices[mesh.faces[face_idx]]
+    origin = tri[:, 0]
+    return (origin
+            + uv[:, :1] * (tri[:, 1] - origin)
+            + uv[:, 1:] * (tri[:, 2] - origin))
+
+
 class CADEvaluationSystem:
     """Educational CAD model evaluation system using geometric analysis"""
     
@@ -96,20 +186,23 @@ class CADEvaluationSystem:
             'D': (65, 74),
             'F': (0, 64)
         }
+        
+        # Point-pair count below which a dense distance matrix beats kd-trees
+        self.dense_distance_limit = 4_000_000
+        # Concurrent dense evaluations; each holds a float64 N x M matrix
+        # (up to 32 MB at dense_distance_limit)
+        self.dense_max_workers = 4
+    
+    def uses_dense_distances(self, num_teacher: int, num_student: int) -> bool:
+        """Whether a teacher/student pair this size takes the dense cdist path"""
+        return num_teacher * num_student <= self.dense_distance_limit
     
     def load_mesh(self, file_data, file_name):
         """Load mesh from uploaded file data"""
         try:
-            # Save to temp file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=Path(file_name).suffix) as tmp:
-                tmp.write(file_data.getbuffer())
-                tmp_path = tmp.name
-            
-            # Load with trimesh
-            loaded = trimesh.load(tmp_path)
-            
-            # Clean up temp file
-            os.unlink(tmp_path)
+            # Load with trimesh directly from memory
+            loaded = trimesh.load(file_obj=BytesIO(file_data.getbuffer()),
+                                  file_type=Path(file_name).suffix.lstrip('.').lower())
             
             # Handle Scene objects
             if isinstance(loaded, trimesh.Scene):
@@ -125,16 +218,22 @@ class CADEvaluationSystem:
             st.error(f"Error loading {file_name}: {str(e)}")
             return None
     
-    def extract_point_cloud(self, mesh: trimesh.Trimesh, num_points: int = 2048) -> np.ndarray:
-        """Extract point cloud from mesh"""
+    def extract_point_cloud(self, mesh: trimesh.Trimesh, num_points: int = 2048,
+                            seed: Optional[int] = None) -> np.ndarray:
+        """Extract point cloud from mesh (deterministic when seed is given)"""
+        rng = np.random.default_rng(seed)
+        
         if mesh.is_watertight:
-            points, _ = trimesh.sample.sample_surface(mesh, num_points)
+            points = _sample_surface(mesh, num_points, rng)
         else:
             if len(mesh.vertices) >= num_points:
-                indices = np.random.choice(len(mesh.vertices), num_points, replace=False)
+                # Generator.choice uses Floyd's algorithm (O(k) memory) when
+                # k << n; point order is irrelevant so skip the final shuffle
+                indices = rng.choice(len(mesh.vertices), num_points,
+                                     replace=False, shuffle=False)
                 points = mesh.vertices[indices]
             else:
-                indices = np.random.choice(len(mesh.vertices), num_points, replace=True)
+                indices = rng.choice(len(mesh.vertices), num_points, replace=True)
                 points = mesh.vertices[indices]
         
         # Normalize to unit sphere
@@ -145,32 +244,54 @@ class CADEvaluationSystem:
         
         return points.astype(np.float32)
     
-    def compute_geometric_differences(self, teacher_points: np.ndarray, 
-                                     student_points: np.ndarray) -> Dict[str, Any]:
-        """Compute detailed geometric differences"""
+    def compute_geometric_differences(self, teacher_tree: Optional[cKDTree],
+                                     teacher_points: np.ndarray,
+                                     student_points: np.ndarray,
+                                     workers: int = -1) -> Dict[str, Any]:
+        """Compute detailed geometric differences
         
-        # Find nearest neighbors
-        nn_teacher_to_student = NearestNeighbors(n_neighbors=1)
-        nn_teacher_to_student.fit(student_points)
-        distances_t_to_s, _ = nn_teacher_to_student.kneighbors(teacher_points)
+        teacher_tree is a cKDTree over teacher_points, built once by the caller
+        and shared across all students. workers is passed to the kd-tree
+        queries (-1 uses all cores). Clouds small enough for a dense distance
+        matrix (see uses_dense_distances) skip the kd-trees entirely, so
+        teacher_tree may be None for them; it is built here if needed.
+        """
         
-        nn_student_to_teacher = NearestNeighbors(n_neighbors=1)
-        nn_student_to_teacher.fit(teacher_points)
-        distances_s_to_t, _ = nn_student_to_teacher.kneighbors(student_points)
+        teacher_points = np.ascontiguousarray(teacher_points, dtype=np.float32)
+        student_points = np.ascontiguousarray(student_points, dtype=np.float32)
+        
+        if self.uses_dense_distances(len(teacher_points), len(student_points)):
+            # Small clouds: one vectorized distance matrix serves both directions
+            sq_dists = cdist(teacher_points, student_points, 'sqeuclidean')
+            distances_t_to_s = np.sqrt(sq_dists.min(axis=1)).astype(np.float32)
+            haus_s_to_t = np.float32(np.sqrt(sq_dists.min(axis=0).max()))
+        else:
+            # Find nearest neighbors (k=1 queries return 1-D distance arrays)
+            tree_s = build_kdtree(student_points)
+            distances_t_to_s, _ = tree_s.query(teacher_points, k=1, workers=workers)
+            distances_t_to_s = distances_t_to_s.astype(np.float32)
+            
+            if teacher_tree is None:
+                teacher_tree = build_kdtree(teacher_points)
+            # Reverse direction only contributes its maximum to the Hausdorff distance
+            distances_s_to_t, _ = teacher_tree.query(student_points, k=1, workers=workers)
+            haus_s_to_t = np.float32(np.max(distances_s_to_t))
         
-        distances_t_to_s = distances_t_to_s.flatten()
-        distances_s_to_t = distances_s_to_t.flatten()
+        # Fused reduction pass plus one partition for all order statistics
+        mean_dev, max_dev, std_dev, _ = _reduce_stats(distances_t_to_s)
+        n = distances_t_to_s.size
+        k50, k95, k99 = int(0.5 * (n - 1)), int(0.95 * (n - 1)), int(0.99 * (n - 1))
+        part = np.partition(distances_t_to_s, [k50, k95, k99])
         
         return {
             'teacher_to_student_distances': distances_t_to_s,
-            'student_to_teacher_distances': distances_s_to_t,
-            'mean_deviation': np.mean(distances_t_to_s),
-            'max_deviation': np.max(distances_t_to_s),
-            'std_deviation': np.std(distances_t_to_s),
-            'median_deviation': np.median(distances_t_to_s),
-            'percentile_95': np.percentile(distances_t_to_s, 95),
-            'percentile_99': np.percentile(distances_t_to_s, 99),
-            'hausdorff_distance': max(np.max(distances_t_to_s), np.max(distances_s_to_t))
+            'mean_deviation': mean_dev,
+            'max_deviation': max_dev,
+            'std_deviation': std_dev,
+            'median_deviation': part[k50],
+            'percentile_95': part[k95],
+            'percentile_99': part[k99],
+            'hausdorff_distance': max(max_dev, haus_s_to_t)
         }
     
     def calculate_grade(self, geometric_results: Dict[str, Any]) -> Dict[str, Any]:
@@ -220,8 +341,23 @@ class CADEvaluationSystem:
         }
     
     def create_evaluation_heatmap(self, points: np.ndarray, deviations: np.ndarray,
-                                 title: str = "Geometric Accuracy Heatmap") -> go.Figure:
-        """Create interactive 3D heatmap"""
+                                 title: str = "Geometric Accuracy Heatmap",
+                                 max_points: int = 2000,
+                                 cmax: Optional[float] = None) -> go.Figure:
+        """Create interactive 3D heatmap (downsampled to max_points for display)
+        
+        cmax caps the color scale; pass the already computed 95th percentile
+        deviation to avoid recomputing it here.
+        """
+        
+        if cmax is None:
+            k95 = int(0.95 * (deviations.size - 1))
+            cmax = np.partition(deviations, k95)[k95]
+        
+        if len(points) > max_points:
+            idx = np.random.default_rng(0).choice(len(points), max_points, replace=False)
+            points = points[idx]
+            deviations = deviations[idx]
         
         fig = go.Figure(data=[go.Scatter3d(
             x=points[:, 0],
@@ -235,10 +371,9 @@ class CADEvaluationSystem:
                 opacity=0.8,
                 colorbar=dict(title="Deviation"),
                 cmin=0,
-                cmax=np.percentile(deviations, 95)
+                cmax=cmax
             ),
-            text=[f'Deviation: {d:.4f}' for d in deviations],
-            hovertemplate='<b>Point</b><br>X: %{x:.3f}<br>Y: %{y:.3f}<br>Z: %{z:.3f}<br>%{text}<extra></extra>'
+            hovertemplate='<b>Point</b><br>X: %{x:.3f}<br>Y: %{y:.3f}<br>Z: %{z:.3f}<br>Deviation: %{marker.color:.4f}<extra></extra>'
         )])
         
         fig.update_layout(
@@ -263,10 +398,11 @@ class MetadataPlagiarismDetector:
     
     def extract_file_metadata(self, file_data, file_name) -> Dict[str, Any]:
         """Extract metadata from uploaded file"""
+        buf = file_data.getbuffer()
         metadata = {
             'file_name': file_name,
-            'file_size': len(file_data.getbuffer()),
-            'file_hash': hashlib.md5(file_data.getbuffer()).hexdigest(),
+            'file_size': buf.nbytes,
+            'file_hash': hashlib.sha256(buf).digest(),  # raw 32-byte digest
             'upload_time': datetime.now()
         }
         return metadata
@@ -274,43 +410,71 @@ class MetadataPlagiarismDetector:
     def analyze_timestamp_patterns(self, submissions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Detect suspicious patterns across submissions"""
         suspicious_pairs = []
+        n = len(submissions)
+        if n < 2:
+            return suspicious_pairs
         
-        for i, sub1 in enumerate(submissions):
-            for j, sub2 in enumerate(submissions[i+1:], i+1):
-                suspicion_score = 0
-                reasons = []
-                
-                # Check file sizes
-                size_diff = abs(sub1['file_size'] - sub2['file_size'])
-                if size_diff == 0:
-                    suspicion_score += 60
-                    reasons.append("Identical file size")
-                elif size_diff < 1024:
-                    suspicion_score += 35
-                    reasons.append(f"Nearly identical size (diff: {size_diff} bytes)")
-                
-                # Check file hash
-                if sub1['file_hash'] == sub2['file_hash']:
-                    suspicion_score += 100
-                    reasons.append("⚠️ EXACT COPY - Identical file hash!")
-                
-                # Check upload time
-                time_diff = abs((sub1['upload_time'] - sub2['upload_time']).total_seconds())
-                if time_diff < 300:  # 5 minutes
-                    suspicion_score += 40
-                    reasons.append(f"Uploaded {int(time_diff/60)} minutes apart")
-                
-                if suspicion_score >= self.suspicion_threshold:
-                    suspicious_pairs.append({
-                        'student1': sub1['file_name'],
-                        'student2': sub2['file_name'],
-                        'suspicion_score': suspicion_score,
-                        'reasons': reasons,
-                        'severity': self._get_severity(suspicion_score)
-                    })
+        sizes = np.fromiter((s['file_size'] for s in submissions), dtype=np.int64, count=n)
+        times = np.array([s['upload_time'].timestamp() for s in submissions])
+        
+        # Bucket exact copies by hash in O(N) and emit them directly
+        hash_groups = defaultdict(list)
+        for idx, sub in enumerate(submissions):
+            hash_groups[sub['file_hash']].append(idx)
+        
+        group_ids = np.empty(n, dtype=np.int64)
+        for group_id, members in enumerate(hash_groups.values()):
+            group_ids[members] = group_id
+            for a, i in enumerate(members):
+                for j in members[a+1:]:
+                    # Identical hash implies identical size (60) + exact copy (100)
+                    suspicion_score = 160
+                    reasons = ["Identical file size", "⚠️ EXACT COPY - Identical file hash!"]
+                    time_diff = abs(times[i] - times[j])
+                    if time_diff < 300:  # 5 minutes
+                        suspicion_score += 40
+                        reasons.append(f"Uploaded {int(time_diff/60)} minutes apart")
+                    suspicious_pairs.append(
+                        self._make_pair(submissions[i], submissions[j], suspicion_score, reasons))
+        
+        # Score the remaining cross-group pairs with pairwise matrices
+        size_diff = np.abs(sizes[:, None] - sizes[None, :])
+        time_diff = np.abs(times[:, None] - times[None, :])
+        same_hash = group_ids[:, None] == group_ids[None, :]
+        
+        # File size: identical = 60, within 1 KB = 35
+        score = np.where(size_diff == 0, 60, np.where(size_diff < 1024, 35, 0))
+        # Upload time: within 5 minutes = 40
+        score += np.where(time_diff < 300, 40, 0)
+        
+        rows, cols = np.triu_indices(n, k=1)
+        flagged = (score[rows, cols] >= self.suspicion_threshold) & ~same_hash[rows, cols]
+        
+        for i, j in zip(rows[flagged], cols[flagged]):
+            reasons = []
+            if size_diff[i, j] == 0:
+                reasons.append("Identical file size")
+            elif size_diff[i, j] < 1024:
+                reasons.append(f"Nearly identical size (diff: {size_diff[i, j]} bytes)")
+            if time_diff[i, j] < 300:
+                reasons.append(f"Uploaded {int(time_diff[i, j]/60)} minutes apart")
+            
+            suspicious_pairs.append(
+                self._make_pair(submissions[i], submissions[j], int(score[i, j]), reasons))
         
         return sorted(suspicious_pairs, key=lambda x: x['suspicion_score'], reverse=True)
     
+    def _make_pair(self, sub1: Dict[str, Any], sub2: Dict[str, Any],
+                   suspicion_score: int, reasons: List[str]) -> Dict[str, Any]:
+        """Build a suspicious pair record"""
+        return {
+            'student1': sub1['file_name'],
+            'student2': sub2['file_name'],
+            'suspicion_score': suspicion_score,
+            'reasons': reasons,
+            'severity': self._get_severity(suspicion_score)
+        }
+    
     def _get_severity(self, score: int) -> str:
         """Determine severity level"""
         if score >= 100:
@@ -325,6 +489,51 @@ class MetadataPlagiarismDetector:
             return "🟢 LOW"
 
 
+def _eval_one(evaluator: CADEvaluationSystem, teacher_tree: Optional[cKDTree],
+              teacher_points: np.ndarray,
+              student_points: np.ndarray) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Evaluate one student point cloud against the shared teacher tree"""
+    # Parallelism comes from the thread pool, so keep queries single-threaded
+    geometric_results = evaluator.compute_geometric_differences(
+        teacher_tree, teacher_points, student_points, workers=1)
+    grading_results = evaluator.calculate_grade(geometric_results)
+    return geometric_results, grading_results
+
+
+def compute_mesh_hash(mesh: trimesh.Trimesh) -> str:
+    """Content hash identifying a mesh for point cloud caching"""
+    return hashlib.md5(mesh.vertices.tobytes() + mesh.faces.tobytes()).hexdigest()
+
+
+@st.cache_data(show_spinner=False)
+def cached_point_cloud(mesh_hash: str, num_points: int, _mesh: trimesh.Trimesh) -> np.ndarray:
+    """Point cloud for a mesh, memoized on (mesh hash, num_points)"""
+    return CADEvaluationSystem().extract_point_cloud(_mesh, num_points, seed=0)
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def cached_heatmap(points: np.ndarray, deviations: np.ndarray, title: str,
+                   cmax: Optional[float] = None) -> go.Figure:
+    """Evaluation heatmap, memoized on its input arrays"""
+    return CADEvaluationSystem().create_evaluation_heatmap(
+        points, deviations, title, cmax=cmax)
+
+
+def _collect_grades() -> Tuple[Tuple[str, ...], Tuple[float, ...]]:
+    """Letter grades and scores from the current evaluation results"""
+    results = st.session_state.evaluation_results.values()
+    return (tuple(r['grade']['letter_grade'] for r in results),
+            tuple(r['grade']['numerical_score'] for r in results))
+
+
+@st.cache_data(show_spinner=False)
+def class_statistics(grades: Tuple[str, ...],
+                     scores: Tuple[float, ...]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Score array and sorted grade counts for the class, memoized on the grades"""
+    grade_labels, grade_counts = np.unique(np.array(grades), return_counts=True)
+    return np.array(scores), grade_labels, grade_counts
+
+
 def generate_student_report(student_name: str, teacher_model, student_model,
                            evaluation_results: Dict, plagiarism_info: Dict) -> str:
     """Generate individual student report"""
@@ -452,6 +661,7 @@ def main():
                 if teacher_mesh:
                     st.session_state.teacher_model = {
                         'mesh': teacher_mesh,
+                        'hash': compute_mesh_hash(teacher_mesh),
                         'name': teacher_file.name,
                         'data': teacher_file
                     }
@@ -472,6 +682,7 @@ def main():
                     if student_mesh:
                         st.session_state.student_models[student_file.name] = {
                             'mesh': student_mesh,
+                            'hash': compute_mesh_hash(student_mesh),
                             'name': student_file.name,
                             'data': student_file,
                             'metadata': plagiarism_detector.extract_file_metadata(
@@ -495,38 +706,47 @@ def main():
                 progress = st.progress(0)
                 
                 # Extract teacher point cloud
-                teacher_points = evaluator.extract_point_cloud(
-                    st.session_state.teacher_model['mesh'], num_points)
+                teacher_points = cached_point_cloud(
+                    st.session_state.teacher_model['hash'], num_points,
+                    st.session_state.teacher_model['mesh'])
+                
+                # Stack all student point clouds into one (S, num_points, 3) buffer
+                student_names = list(st.session_state.student_models.keys())
+                with st.spinner("Sampling student point clouds..."):
+                    student_clouds = np.stack([
+                        cached_point_cloud(data['hash'], num_points, data['mesh'])
+                        for data in st.session_state.student_models.values()
+                    ])
                 
                 results_container = st.container()
                 
-                for i, (student_name, student_data) in enumerate(st.session_state.student_models.items()):
-                    with st.spinner(f"Evaluating {student_name}..."):
-                        # Extract student point cloud
-                        student_points = evaluator.extract_point_cloud(
-                            student_data['mesh'], num_points)
-                        
-                        # Compute differences
-                        geometric_results = evaluator.compute_geometric_differences(
-                            teacher_points, student_points)
-                        
-                        # Calculate grade
-                        grading_results = evaluator.calculate_grade(geometric_results)
-                        
-                        # Create visualization
-                        heatmap = evaluator.create_evaluation_heatmap(
-                            student_points,
-                            geometric_results['teacher_to_student_distances'],
-                            f"{student_name} - Grade: {grading_results['letter_grade']}"
-                        )
+                # Students are independent: evaluate them on a thread pool sharing
+                # one teacher kd-tree (cKDTree queries and cdist release the GIL).
+                # All clouds are the same size, so the distance path is the same
+                # for every student: dense runs need no tree but hold a large
+                # matrix each, so cap how many run at once
+                max_workers = min(os.cpu_count() or 1, len(student_names))
+                if evaluator.uses_dense_distances(len(teacher_points), student_clouds.shape[1]):
+                    teacher_tree = None
+                    max_workers = min(max_workers, evaluator.dense_max_workers)
+                else:
+                    teacher_tree = build_kdtree(teacher_points)
+                with st.spinner("Evaluating students..."), ThreadPoolExecutor(
+                        max_workers=max_workers) as executor:
+                    futures = {executor.submit(_eval_one, evaluator, teacher_tree,
+                                               teacher_points, student_clouds[i]): i
+                               for i in range(len(student_names))}
+                    
+                    for done, future in enumerate(as_completed(futures), 1):
+                        i = futures[future]
+                        student_name = student_names[i]
+                        student_points = student_clouds[i]
+                        geometric_results, grading_results = future.result()
                         
-                        # Store results
+                        # Store raw results only; figures are not kept in session state
                         st.session_state.evaluation_results[student_name] = {
                             'grade': grading_results,
-                            'geometric_analysis': geometric_results,
-                            'visualization': heatmap,
-                            'teacher_points': teacher_points,
-                            'student_points': student_points
+                            'geometric_analysis': geometric_results
                         }
                         
                         # Display results
@@ -543,9 +763,15 @@ def main():
                                 st.metric("Std Deviation", f"{geometric_results['std_deviation']:.4f}")
                                 st.metric("95th Percentile", f"{geometric_results['percentile_95']:.4f}")
                             
+                            heatmap = cached_heatmap(
+                                student_points,
+                                geometric_results['teacher_to_student_distances'],
+                                f"{student_name} - Grade: {grading_results['letter_grade']}",
+                                cmax=geometric_results['percentile_95']
+                            )
                             st.plotly_chart(heatmap, use_container_width=True)
-                    
-                    progress.progress((i + 1) / len(st.session_state.student_models))
+                        
+                        progress.progress(done / len(student_names))
                 
                 st.success("✅ All evaluations complete!")
     
@@ -586,68 +812,67 @@ def main():
         else:
             # Generate individual reports
             if st.button("📄 Generate All Reports", type="primary"):
-                reports_zip = BytesIO()
+                # Index plagiarism matches by student once
+                matches_by_student = defaultdict(list)
+                for pair in st.session_state.plagiarism_results or []:
+                    for student, other in ((pair['student1'], pair['student2']),
+                                           (pair['student2'], pair['student1'])):
+                        matches_by_student[student].append({
+                            'similar_to': other,
+                            'score': pair['suspicion_score'],
+                            'severity': pair['severity'],
+                            'reasons': pair['reasons']
+                        })
                 
-                with zipfile.ZipFile(reports_zip, 'w') as zf:
-                    progress = st.progress(0)
+                # Build the archive on disk so only Streamlit's copy is held in memory
+                with tempfile.TemporaryDirectory() as tmp_dir:
+                    zip_path = Path(tmp_dir) / "reports.zip"
+                    with zipfile.ZipFile(zip_path, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+                        progress = st.progress(0)
+                            
+                        for i, (student_name, eval_results) in enumerate(st.session_state.evaluation_results.items()):
+                            # Find plagiarism info for this student
+                            plagiarism_info = {
+                                'suspicious_matches': matches_by_student.get(student_name, [])
+                            }
+                                
+                            # Generate report
+                            report = generate_student_report(
+                                student_name,
+                                st.session_state.teacher_model,
+                                st.session_state.student_models[student_name],
+                                eval_results,
+                                plagiarism_info
+                            )
+                                
+                            # Add to zip
+                            report_name = f"{Path(student_name).stem}_report.md"
+                            with zf.open(report_name, 'w') as fh:
+                                fh.write(report.encode('utf-8'))
+                                
+                            progress.progress((i + 1) / len(st.session_state.evaluation_results))
+                            
+                        # Add summary report
+                        summary = generate_class_summary()
+                        with zf.open("class_summary.md", 'w') as fh:
+                            fh.write(summary.encode('utf-8'))
                     
-                    for i, (student_name, eval_results) in enumerate(st.session_state.evaluation_results.items()):
-                        # Find plagiarism info for this student
-                        plagiarism_info = {'suspicious_matches': []}
-                        
-                        if st.session_state.plagiarism_results:
-                            for pair in st.session_state.plagiarism_results:
-                                if pair['student1'] == student_name:
-                                    plagiarism_info['suspicious_matches'].append({
-                                        'similar_to': pair['student2'],
-                                        'score': pair['suspicion_score'],
-                                        'severity': pair['severity'],
-                                        'reasons': pair['reasons']
-                                    })
-                                elif pair['student2'] == student_name:
-                                    plagiarism_info['suspicious_matches'].append({
-                                        'similar_to': pair['student1'],
-                                        'score': pair['suspicion_score'],
-                                        'severity': pair['severity'],
-                                        'reasons': pair['reasons']
-                                    })
-                        
-                        # Generate report
-                        report = generate_student_report(
-                            student_name,
-                            st.session_state.teacher_model,
-                            st.session_state.student_models[student_name],
-                            eval_results,
-                            plagiarism_info
+                    # Download button; a file opened 'rb' is read once, whereas a
+                    # BytesIO would be copied by getvalue() alongside the original
+                    with open(zip_path, 'rb') as zip_file:
+                        st.download_button(
+                            label="📥 Download All Reports (ZIP)",
+                            data=zip_file,
+                            file_name=f"cad_assessment_reports_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
+                            mime="application/zip"
                         )
-                        
-                        # Add to zip
-                        report_name = f"{Path(student_name).stem}_report.md"
-                        zf.writestr(report_name, report)
-                        
-                        progress.progress((i + 1) / len(st.session_state.evaluation_results))
-                    
-                    # Add summary report
-                    summary = generate_class_summary()
-                    zf.writestr("class_summary.md", summary)
-                
-                # Download button
-                st.download_button(
-                    label="📥 Download All Reports (ZIP)",
-                    data=reports_zip.getvalue(),
-                    file_name=f"cad_assessment_reports_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
-                    mime="application/zip"
-                )
                 
                 st.success("✅ Reports generated successfully!")
             
             # Display summary statistics
             st.subheader("Class Statistics")
             
-            grades = [r['grade']['letter_grade'] 
-                     for r in st.session_state.evaluation_results.values()]
-            scores = [r['grade']['numerical_score'] 
-                     for r in st.session_state.evaluation_results.values()]
+            scores, grade_labels, grade_counts = class_statistics(*_collect_grades())
             
             col1, col2, col3 = st.columns(3)
             
@@ -656,12 +881,11 @@ def main():
                 st.metric("Median Score", f"{np.median(scores):.1f}%")
             
             with col2:
-                st.metric("Highest Score", f"{max(scores):.1f}%")
-                st.metric("Lowest Score", f"{min(scores):.1f}%")
+                st.metric("Highest Score", f"{scores.max():.1f}%")
+                st.metric("Lowest Score", f"{scores.min():.1f}%")
             
             with col3:
-                grade_counts = pd.Series(grades).value_counts()
-                fig = px.pie(values=grade_counts.values, names=grade_counts.index,
+                fig = px.pie(values=grade_counts, names=grade_labels,
                            title="Grade Distribution")
                 st.plotly_chart(fig, use_container_width=True)
 
@@ -672,8 +896,7 @@ def generate_class_summary() -> str:
     if not st.session_state.evaluation_results:
         return "No evaluation results available"
     
-    grades = [r['grade']['letter_grade'] for r in st.session_state.evaluation_results.values()]
-    scores = [r['grade']['numerical_score'] for r in st.session_state.evaluation_results.values()]
+    scores, grade_labels, grade_counts = class_statistics(*_collect_grades())
     
     summary = f"""
 # CLASS ASSESSMENT SUMMARY
@@ -686,17 +909,16 @@ def generate_class_summary() -> str:
 - **Total Students:** {len(scores)}
 - **Average Score:** {np.mean(scores):.1f}%
 - **Median Score:** {np.median(scores):.1f}%
-- **Highest Score:** {max(scores):.1f}%
-- **Lowest Score:** {min(scores):.1f}%
+- **Highest Score:** {scores.max():.1f}%
+- **Lowest Score:** {scores.min():.1f}%
 - **Standard Deviation:** {np.std(scores):.1f}%
 
 ## Grade Distribution
 
 """
     
-    grade_counts = pd.Series(grades).value_counts().sort_index()
-    for grade, count in grade_counts.items():
-        percentage = (count / len(grades)) * 100
+    for grade, count in zip(grade_labels, grade_counts):
+        percentage = (count / len(scores)) * 100
         summary += f"- **{grade} Grade:** {count} students ({percentage:.1f}%)\n"
     
     summary += f"""
@@ -8,8 +8,66 @@ import os
 import sys
 import subprocess
 import platform
+import hashlib
+import importlib.util
+import shutil
+import tarfile
+import venv
+import zipfile
 from pathlib import Path
 
+# Platform lookups, resolved once at load
+_SYSTEM = platform.system()
+_VENV_PY = Path("venv/Scripts/python.exe" if _SYSTEM == "Windows" else "venv/bin/python")
+_VENV_PIP = Path("venv/Scripts/pip.exe" if _SYSTEM == "Windows" else "venv/bin/pip")
+
+# Core dependencies
+CORE_PACKAGES = [
+    "streamlit>=1.28.0",
+    "numpy>=1.24.0",
+    "pandas>=2.0.0",
+    "trimesh[easy]>=4.0.0",  # with easy extras
+    "plotly>=5.17.0",
+    "scipy>=1.10.0",  # last release line with Python 3.8 wheels
+    "networkx>=3.1"
+]
+
+# Optional packages (don't fail if they can't be installed)
+OPTIONAL_PACKAGES = [
+    ("pymeshlab", "Advanced mesh repair"),
+    ("cascadio", "STEP file conversion"),
+    ("numba", "JIT-compiled deviation statistics")
+]
+
+# Pre-resolved transitive closure of CORE_PACKAGES (see file header)
+LOCK_FILE = Path("requirements.lock")
+LOCK_MIN_PYTHON = (3, 9)
+
+# Modules that must be importable after installation
+REQUIRED_MODULES = ["streamlit", "trimesh", "plotly", "numpy", "pandas", "scipy"]
+
+# pip releases at or above this version are not upgraded during setup
+MIN_PIP_VERSION = (23, 0)
+
+# Finished venvs are archived here, keyed by a hash of the package lists,
+# interpreter and project path
+VENV_CACHE_DIR = Path.home() / ".cache" / "camd"
+
+class Reporter:
+    """Buffer progress messages and write them to stdout in one go"""
+    
+    def __init__(self):
+        self._lines = []
+    
+    def log(self, msg):
+        self._lines.append(msg)
+    
+    def flush(self):
+        if self._lines:
+            sys.stdout.write("\n".join(self._lines) + "\n")
+            sys.stdout.flush()
+            self._lines.clear()
+
 def print_banner():
     """Display welcome banner"""
     banner = """
@@ -45,76 +103,237 @@ def create_virtual_environment():
         return True
     
     try:
-        subprocess.run([sys.executable, "-m", "venv", "venv"], check=True)
+        # Skip ensurepip when an unpacked pip image is cached and copy it in
+        # instead; symlink the interpreter where the platform allows it.
+        # Windows needs .exe launchers for pip, so it always uses ensurepip
+        pip_image = None if _SYSTEM == "Windows" else get_cached_pip_image()
+        builder = venv.EnvBuilder(symlinks=_SYSTEM != "Windows",
+                                  with_pip=pip_image is None)
+        builder.create(str(venv_path))
+        if pip_image is not None:
+            shutil.copytree(pip_image, get_venv_site_packages(), dirs_exist_ok=True)
+            write_pip_scripts()
         print("✅ Virtual environment created")
         return True
-    except subprocess.CalledProcessError:
+    except (subprocess.CalledProcessError, OSError):
         print("❌ Failed to create virtual environment")
         return False
 
-def get_pip_command():
-    """Get the appropriate pip command for the OS"""
-    system = platform.system()
+def get_venv_site_packages():
+    """Get the virtual environment's site-packages directory for the OS"""
+    if _SYSTEM == "Windows":
+        return Path("venv/Lib/site-packages")
+    return next(Path("venv/lib").glob("python*/site-packages"))
+
+def write_pip_scripts():
+    """Write the pip console scripts that installing the wheel would create"""
+    # Same launcher pip generates for its own entry points
+    script = f"""#!{_VENV_PY.absolute()}
+# -*- coding: utf-8 -*-
+import re
+import sys
+from pip._internal.cli.main import main
+if __name__ == '__main__':
+    sys.argv[0] = re.sub(r'(-script\\.pyw|\\.exe)?$', '', sys.argv[0])
+    sys.exit(main())
+"""
+    version = sys.version_info
+    for name in ("pip", f"pip{version.major}", f"pip{version.major}.{version.minor}"):
+        path = _VENV_PIP.with_name(name)
+        path.write_text(script)
+        path.chmod(0o755)
+
+def get_cached_pip_image():
+    """Get the unpacked pip wheel, extracting ensurepip's bundled wheel on first use"""
+    version = f"{sys.version_info.major}{sys.version_info.minor}"
+    image_path = VENV_CACHE_DIR / f"pip-wheel-py{version}"
     
-    if system == "Windows":
-        pip_path = Path("venv/Scripts/pip.exe")
-    else:
-        pip_path = Path("venv/bin/pip")
+    if image_path.exists():
+        return image_path
+    
+    try:
+        import ensurepip
+        bundled = Path(ensurepip.__file__).parent / "_bundled"
+        wheels = sorted(bundled.glob("pip-*.whl"))
+        if not wheels:
+            return None
+        
+        # pip is pure Python, so the unpacked wheel can be copied into site-packages
+        tmp_path = image_path.with_name(image_path.name + ".tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        with zipfile.ZipFile(wheels[-1]) as wheel:
+            wheel.extractall(tmp_path)
+        tmp_path.replace(image_path)
+        return image_path
+    except (ImportError, OSError, zipfile.BadZipFile):
+        return None
+
+def get_venv_cache_path():
+    """Get the cached venv archive path for the current package set"""
+    packages = sorted(CORE_PACKAGES + [p for p, _ in OPTIONAL_PACKAGES])
+    if LOCK_FILE.exists():
+        packages.append(LOCK_FILE.read_text())
+    # pyvenv.cfg and the console script shebangs hard-code the base
+    # interpreter and the venv's absolute path, so both are part of the key
+    packages += [sys.version, sys.executable, str(Path.cwd().resolve())]
+    key = hashlib.sha256("\n".join(packages).encode()).hexdigest()[:16]
+    return VENV_CACHE_DIR / f"venv-{key}.tar"
+
+def restore_cached_venv():
+    """Extract a cached venv for the current package set, if one exists"""
+    cache_path = get_venv_cache_path()
+    
+    if Path("venv").exists() or not cache_path.exists():
+        return False
+    
+    print("\n📌 Restoring virtual environment from cache...")
+    try:
+        extract_kwargs = {"filter": "tar"} if hasattr(tarfile, "tar_filter") else {}
+        with tarfile.open(cache_path) as tar:
+            tar.extractall(".", **extract_kwargs)
+        print(f"✅ Virtual environment restored from {cache_path}")
+        return True
+    except (OSError, tarfile.TarError) as e:
+        print(f"⚠️  Could not restore cached environment: {e}")
+        return False
+
+def save_venv_to_cache():
+    """Archive the finished venv so later setups can skip installation"""
+    cache_path = get_venv_cache_path()
     
-    if pip_path.exists():
-        return str(pip_path)
+    if cache_path.exists():
+        return
+    
+    try:
+        VENV_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(".tmp")
+        with tarfile.open(tmp_path, "w") as tar:
+            tar.add("venv")
+        tmp_path.replace(cache_path)
+        print(f"  ✅ Cached virtual environment: {cache_path}")
+    except (OSError, tarfile.TarError) as e:
+        print(f"  ⚠️  Could not cache virtual environment: {e}")
+
+def get_pip_command():
+    """Get the appropriate pip command prefix for the OS, preferring uv"""
+    # uv resolves and installs in parallel; it targets the venv via --python
+    if shutil.which("uv") and _VENV_PY.exists():
+        return ["uv", "pip"]
+    
+    if _VENV_PIP.exists():
+        return [str(_VENV_PIP)]
+    elif _VENV_PY.exists():
+        # Fall back to the module if the console script is missing
+        return [str(_VENV_PY), "-m", "pip"]
     else:
-        return "pip"
+        return ["pip"]
+
+def get_install_command():
+    """Get the command prefix that installs packages into the venv"""
+    pip_cmd = get_pip_command()
+    if pip_cmd[0] == "uv":
+        return [*pip_cmd, "install", "--python", str(_VENV_PY)]
+    return [*pip_cmd, "install"]
+
+def pip_needs_upgrade(pip_cmd):
+    """Check whether the venv's pip is older than MIN_PIP_VERSION"""
+    result = subprocess.run([*pip_cmd, "--version"], capture_output=True, text=True)
+    if result.returncode != 0:
+        return True
+    
+    # Output looks like "pip 23.2.1 from /path/to/pip (python 3.11)"
+    try:
+        version = tuple(int(part) for part in result.stdout.split()[1].split(".")[:2])
+    except (IndexError, ValueError):
+        return True
+    return version < MIN_PIP_VERSION
+
+def _install_one(install_cmd, package):
+    """Install a single package, returning the completed process"""
+    # Only the return code is inspected, so discard the output
+    result = subprocess.run([*install_cmd, package], 
+                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return result
+
+def _run_streamed(cmd):
+    """Run an install command with its progress going straight to the terminal"""
+    # pip streams progress on stdout, so only its stderr is kept for errors;
+    # uv reports progress on stderr, so leave that attached as well
+    stderr = None if cmd[0] == "uv" else subprocess.PIPE
+    return subprocess.run(cmd, stdout=None, stderr=stderr, text=True)
 
 def install_dependencies():
-    """Install required Python packages"""
-    print("\n📌 Installing dependencies...")
+    """Install required Python packages
     
-    pip_cmd = get_pip_command()
+    Failures are reported but never abort setup; returns False if any core
+    package could not be installed, so the venv is not cached.
+    """
+    print("\n📌 Installing dependencies...")
     
-    # Upgrade pip first
-    print("  Upgrading pip...")
-    subprocess.run([pip_cmd, "install", "--upgrade", "pip"], 
-                  capture_output=True)
-    
-    # Core dependencies
-    core_packages = [
-        "streamlit>=1.28.0",
-        "numpy>=1.24.0",
-        "pandas>=2.0.0",
-        "trimesh[easy]>=4.0.0",  # with easy extras
-        "scikit-learn>=1.3.0",
-        "plotly>=5.17.0",
-        "scipy>=1.11.0",
-        "networkx>=3.1"
-    ]
+    install_cmd = get_install_command()
     
-    # Install core packages
-    print("  Installing core packages...")
-    for package in core_packages:
-        print(f"    Installing {package}...")
-        result = subprocess.run([pip_cmd, "install", package], 
-                              capture_output=True, text=True)
+    # Upgrade pip first if it is outdated (uv does not use the venv's pip)
+    if install_cmd[0] == "uv":
+        print("  Using uv for package installation")
+    elif pip_needs_upgrade(get_pip_command()):
+        print("  Upgrading pip...")
+        subprocess.run([*install_cmd, "--upgrade", "pip"], 
+                      stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    else:
+        print("  pip is up to date")
+    
+    # Install the locked core set without dependency resolution when available
+    result = None
+    core_failed = False
+    if LOCK_FILE.exists() and sys.version_info >= LOCK_MIN_PYTHON:
+        print("  Installing core packages from lock file...")
+        # --prefer-binary is pip-only; uv always prefers wheels
+        binary_args = [] if install_cmd[0] == "uv" else ["--prefer-binary"]
+        result = _run_streamed([*install_cmd, "--no-deps", *binary_args,
+                                "-r", str(LOCK_FILE)])
         if result.returncode != 0:
-            print(f"    ⚠️  Warning: Issue installing {package}")
+            print("    ⚠️  Lock file install failed, resolving dependencies...")
+            if result.stderr:
+                print(f"        {result.stderr}")
+    
+    # Otherwise install core packages in one pip run, falling back to one at a time
+    if result is None or result.returncode != 0:
+        print("  Installing core packages...")
+        result = _run_streamed([*install_cmd, *CORE_PACKAGES])
+    if result.returncode != 0:
+        print("    ⚠️  Batch install failed, retrying packages individually...")
+        if result.stderr:
             print(f"        {result.stderr}")
-    
-    # Optional packages (don't fail if they can't be installed)
-    optional_packages = [
-        ("pymeshlab", "Advanced mesh repair"),
-        ("cascadio", "STEP file conversion")
-    ]
+        reporter = Reporter()
+        for package in CORE_PACKAGES:
+            result = subprocess.run([*install_cmd, package], 
+                                  capture_output=True, text=True)
+            if result.returncode != 0:
+                core_failed = True
+                reporter.log(f"    ⚠️  Warning: Issue installing {package}")
+                reporter.log(f"        {result.stderr}")
+        reporter.flush()
     
     print("\n  Installing optional packages...")
-    for package, description in optional_packages:
-        print(f"    Installing {package} ({description})...")
-        result = subprocess.run([pip_cmd, "install", package], 
-                              capture_output=True, text=True)
-        if result.returncode == 0:
-            print(f"    ✅ {package} installed")
-        else:
-            print(f"    ⚠️  {package} not available (optional)")
-    
+    reporter = Reporter()
+    result = _run_streamed([*install_cmd, *[p for p, _ in OPTIONAL_PACKAGES]])
+    if result.returncode == 0:
+        for package, description in OPTIONAL_PACKAGES:
+            reporter.log(f"    ✅ {package} installed ({description})")
+    else:
+        # Retry one at a time: optional packages share dependencies (numpy,
+        # llvmlite) and concurrent installs into one venv would race on them
+        for package, description in OPTIONAL_PACKAGES:
+            result = _install_one(install_cmd, package)
+            if result.returncode == 0:
+                reporter.log(f"    ✅ {package} installed ({description})")
+            else:
+                reporter.log(f"    ⚠️  {package} not available (optional)")
+    reporter.flush()
+    
+    if core_failed:
+        print("\n⚠️  Dependencies installed with errors (see warnings above)")
+        return False
     print("\n✅ Dependencies installation complete")
     return True
 
@@ -128,9 +347,16 @@ def create_directories():
         "reports"
     ]
     
+    # Only leaf directories need creating; their parents come along for free
+    leaves = [d for d in directories
+              if not any(other.startswith(d + "/") for other in directories)]
+    for dir_path in leaves:
+        os.makedirs(dir_path, exist_ok=True)
+    
+    reporter = Reporter()
     for dir_path in directories:
-        Path(dir_path).mkdir(parents=True, exist_ok=True)
-        print(f"  ✅ Created: {dir_path}")
+        reporter.log(f"  ✅ Created: {dir_path}")
+    reporter.flush()
 
 def create_sample_files():
     """Create sample configuration files"""
@@ -167,14 +393,7 @@ Thumbs.db
 *.swp
 """
     
-    with open(".gitignore", "w") as f:
-        f.write(gitignore_content)
-    print("  ✅ Created .gitignore")
-    
     # Create .streamlit/config.toml
-    streamlit_dir = Path(".streamlit")
-    streamlit_dir.mkdir(exist_ok=True)
-    
     config_content = """
 [theme]
 primaryColor = "#667eea"
@@ -192,40 +411,43 @@ enableXsrfProtection = true
 gatherUsageStats = false
 """
     
-    with open(streamlit_dir / "config.toml", "w") as f:
-        f.write(config_content)
-    print("  ✅ Created Streamlit config")
+    files = {
+        Path(".gitignore"): (gitignore_content, ".gitignore"),
+        Path(".streamlit/config.toml"): (config_content, "Streamlit config"),
+    }
+    
+    for path, (content, label) in files.items():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+        print(f"  ✅ Created {label}")
 
 def test_installation():
     """Test if the installation was successful"""
     print("\n📌 Testing installation...")
     
-    pip_cmd = get_pip_command()
+    # Check that modules are importable without importing them
+    # (find_spec skips the multi-second import cost of the heavy libraries)
+    if Path(sys.prefix).resolve() == Path("venv").resolve():
+        # Already running inside the venv: check in-process
+        missing = [m for m in REQUIRED_MODULES if importlib.util.find_spec(m) is None]
+        if missing:
+            print(f"❌ Missing modules: {', '.join(missing)}")
+            return False
+        print("✅ All core modules available")
+        return True
     
-    # Test imports
-    test_script = """
+    test_script = f"""
 import sys
-try:
-    import streamlit
-    import trimesh
-    import plotly
-    import numpy
-    import pandas
-    import sklearn
-    print("✅ All core modules imported successfully")
-    sys.exit(0)
-except ImportError as e:
-    print(f"❌ Import error: {e}")
+import importlib.util
+missing = [m for m in {REQUIRED_MODULES!r} if importlib.util.find_spec(m) is None]
+if missing:
+    print(f"❌ Missing modules: {{', '.join(missing)}}")
     sys.exit(1)
+print("✅ All core modules available")
+sys.exit(0)
 """
     
-    # Get Python executable from venv
-    if platform.system() == "Windows":
-        python_cmd = "venv/Scripts/python.exe"
-    else:
-        python_cmd = "venv/bin/python"
-    
-    result = subprocess.run([python_cmd, "-c", test_script], 
+    result = subprocess.run([str(_VENV_PY), "-c", test_script], 
                           capture_output=True, text=True)
     
     if result.returncode == 0:
@@ -239,9 +461,7 @@ except ImportError as e:
 def print_instructions():
     """Print usage instructions"""
     
-    system = platform.system()
-    
-    if system == "Windows":
+    if _SYSTEM == "Windows":
         activate_cmd = "venv\\Scripts\\activate"
     else:
         activate_cmd = "source venv/bin/activate"
@@ -288,15 +508,17 @@ def main():
         print("\n❌ Setup failed: Python version requirement not met")
         sys.exit(1)
     
-    # Create virtual environment
-    if not create_virtual_environment():
-        print("\n❌ Setup failed: Could not create virtual environment")
-        sys.exit(1)
-    
-    # Install dependencies
-    if not install_dependencies():
-        print("\n❌ Setup failed: Could not install dependencies")
-        sys.exit(1)
+    # Reuse a cached environment when the package set is unchanged
+    restored = restore_cached_venv()
+    installed = False
+    if not restored:
+        # Create virtual environment
+        if not create_virtual_environment():
+            print("\n❌ Setup failed: Could not create virtual environment")
+            sys.exit(1)
+        
+        # Install dependencies (core failures are warned about, not fatal)
+        installed = install_dependencies()
     
     # Create directories
     create_directories()
@@ -307,6 +529,9 @@ def main():
     # Test installation
     if not test_installation():
         print("\n⚠️  Warning: Some imports failed. Check error messages above.")
+    elif installed:
+        # Only cache an environment that installed and imports cleanly
+        save_venv_to_cache()
     
     # Print instructions
     print_instructions()
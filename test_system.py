@@ -10,7 +10,56 @@ import numpy as np
 import trimesh
 from pathlib import Path
 import json
+import io
+import threading
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+class _ThreadBufferedStdout(io.TextIOBase):
+    """stdout proxy that buffers writes from worker threads separately"""
+    
+    def __init__(self, stream):
+        self._stream = stream
+        self._local = threading.local()
+    
+    def write(self, text):
+        buffer = getattr(self._local, 'buffer', None)
+        return (buffer if buffer is not None else self._stream).write(text)
+    
+    def flush(self):
+        self._stream.flush()
+    
+    def run_buffered(self, func):
+        """Run func with this thread's output buffered; return (result, output)"""
+        self._local.buffer = io.StringIO()
+        try:
+            return func(), self._local.buffer.getvalue()
+        finally:
+            self._local.buffer = None
+
+# OBJ text for an axis-aligned box centred at the origin; vertex k sits at
+# (+x if k & 4, +y if k & 2, +z if k & 1) and faces wind outwards
+BOX_OBJ = """v {mx} {my} {mz}
+v {mx} {my} {pz}
+v {mx} {py} {mz}
+v {mx} {py} {pz}
+v {px} {my} {mz}
+v {px} {my} {pz}
+v {px} {py} {mz}
+v {px} {py} {pz}
+f 1 2 4 3
+f 5 7 8 6
+f 1 5 6 2
+f 3 4 8 7
+f 1 3 7 5
+f 2 6 8 4
+"""
+
+def box_obj(extents):
+    """OBJ text for an axis-aligned box with the given extents"""
+    hx, hy, hz = (e / 2 for e in extents)
+    return BOX_OBJ.format(px=hx, py=hy, pz=hz, mx=-hx, my=-hy, mz=-hz).encode()
 
 def create_sample_models():
     """Create sample CAD models for testing"""
@@ -20,43 +69,26 @@ def create_sample_models():
     Path("sample_models/teacher").mkdir(parents=True, exist_ok=True)
     Path("sample_models/students").mkdir(parents=True, exist_ok=True)
     
-    # Create a simple box as teacher reference
-    teacher_box = trimesh.creation.box(extents=[2, 2, 2])
-    teacher_path = "sample_models/teacher/reference_box.obj"
-    teacher_box.export(teacher_path)
-    print(f"  ✅ Created teacher reference: {teacher_path}")
-    
-    # Create student models with varying accuracy
-    
-    # Student 1: Perfect match (Grade A expected)
-    student1_box = trimesh.creation.box(extents=[2, 2, 2])
-    student1_path = "sample_models/students/student1_perfect.obj"
-    student1_box.export(student1_path)
-    print(f"  ✅ Created Student 1 (perfect): {student1_path}")
-    
-    # Student 2: Slightly off (Grade B expected)
-    student2_box = trimesh.creation.box(extents=[2.1, 2.1, 2.1])
-    student2_path = "sample_models/students/student2_good.obj"
-    student2_box.export(student2_path)
-    print(f"  ✅ Created Student 2 (good): {student2_path}")
-    
-    # Student 3: More deviation (Grade C expected)
-    student3_box = trimesh.creation.box(extents=[2.3, 2.3, 2.3])
-    student3_path = "sample_models/students/student3_acceptable.obj"
-    student3_box.export(student3_path)
-    print(f"  ✅ Created Student 3 (acceptable): {student3_path}")
+    # (path, extents, label) for the teacher reference and student models with
+    # varying accuracy: students 1-4 are expected to grade A, B, C and D/F;
+    # student 5 is a copy of student 1 for plagiarism detection
+    models = [
+        ("sample_models/teacher/reference_box.obj", (2, 2, 2), "teacher reference"),
+        ("sample_models/students/student1_perfect.obj", (2, 2, 2), "Student 1 (perfect)"),
+        ("sample_models/students/student2_good.obj", (2.1, 2.1, 2.1), "Student 2 (good)"),
+        ("sample_models/students/student3_acceptable.obj", (2.3, 2.3, 2.3), "Student 3 (acceptable)"),
+        ("sample_models/students/student4_poor.obj", (3, 3, 3), "Student 4 (poor)"),
+        ("sample_models/students/student5_copy.obj", (2, 2, 2), "Student 5 (copy)"),
+    ]
     
-    # Student 4: Significant deviation (Grade D/F expected)
-    student4_box = trimesh.creation.box(extents=[3, 3, 3])
-    student4_path = "sample_models/students/student4_poor.obj"
-    student4_box.export(student4_path)
-    print(f"  ✅ Created Student 4 (poor): {student4_path}")
+    # Identical boxes share one payload; the file writes are I/O bound,
+    # so issue them concurrently
+    payloads = {extents: box_obj(extents) for _, extents, _ in models}
+    pairs = [(path, payloads[extents]) for path, extents, _ in models]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lambda pair: Path(pair[0]).write_bytes(pair[1]), pairs))
     
-    # Student 5: Copy of Student 1 (for plagiarism detection)
-    student5_box = trimesh.creation.box(extents=[2, 2, 2])
-    student5_path = "sample_models/students/student5_copy.obj"
-    student5_box.export(student5_path)
-    print(f"  ✅ Created Student 5 (copy): {student5_path}")
+    print("\n".join(f"  ✅ Created {label}: {path}" for path, _, label in models))
     
     return True
 
@@ -70,21 +102,22 @@ def test_imports():
         ('pandas', 'Pandas (data analysis)'),
         ('trimesh', 'Trimesh (3D mesh processing)'),
         ('plotly', 'Plotly (visualization)'),
-        ('sklearn', 'Scikit-learn (machine learning)'),
+        ('scipy', 'SciPy (spatial queries)'),
     ]
     
     all_success = True
+    messages = []
     
     for module_name, description in modules_to_test:
         try:
             __import__(module_name)
-            print(f"  ✅ {description}: OK")
+            messages.append(f"  ✅ {description}: OK")
         except ImportError as e:
-            print(f"  ❌ {description}: FAILED - {e}")
+            messages.append(f"  ❌ {description}: FAILED - {e}")
             all_success = False
     
     # Test optional modules
-    print("\n  Optional modules:")
+    messages.append("\n  Optional modules:")
     optional_modules = [
         ('pymeshlab', 'PyMeshLab (advanced mesh repair)'),
         ('cascadio', 'Cascadio (STEP file conversion)'),
@@ -93,10 +126,11 @@ def test_imports():
     for module_name, description in optional_modules:
         try:
             __import__(module_name)
-            print(f"    ✅ {description}: Available")
+            messages.append(f"    ✅ {description}: Available")
         except ImportError:
-            print(f"    ⚠️  {description}: Not installed (optional)")
+            messages.append(f"    ⚠️  {description}: Not installed (optional)")
     
+    print("\n".join(messages))
     return all_success
 
 def test_evaluation_system():
@@ -106,26 +140,37 @@ def test_evaluation_system():
     try:
         # Import the evaluation system from app.py
         sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
-        from app import CADEvaluationSystem, MetadataPlagiarismDetector
+        from app import CADEvaluationSystem, MetadataPlagiarismDetector, build_kdtree
         
         # Initialize evaluator
         evaluator = CADEvaluationSystem()
         print("  ✅ CAD Evaluation System initialized")
         
-        # Test with sample models
+        # Test with a sample model (smoke test, so a small cloud is enough)
         teacher_mesh = trimesh.creation.box(extents=[2, 2, 2])
-        student_mesh = trimesh.creation.box(extents=[2.1, 2.1, 2.1])
         
-        # Extract point clouds
-        teacher_points = evaluator.extract_point_cloud(teacher_mesh, 1000)
-        student_points = evaluator.extract_point_cloud(student_mesh, 1000)
+        # Extract one point cloud and offset it for the student
+        teacher_points = evaluator.extract_point_cloud(teacher_mesh, 200)
+        student_points = teacher_points + np.array([0.1, 0.1, 0.1], dtype=np.float32)
         print("  ✅ Point cloud extraction working")
         
-        # Compute differences
+        # Compute differences (small clouds take the dense path, which needs no tree)
         geometric_results = evaluator.compute_geometric_differences(
-            teacher_points, student_points)
+            None, teacher_points, student_points)
         print(f"  ✅ Geometric analysis working (mean deviation: {geometric_results['mean_deviation']:.4f})")
         
+        # Force the kd-tree path and compare it against the dense result
+        dense_limit, evaluator.dense_distance_limit = evaluator.dense_distance_limit, 0
+        tree_results = evaluator.compute_geometric_differences(
+            build_kdtree(teacher_points), teacher_points, student_points)
+        evaluator.dense_distance_limit = dense_limit
+        mismatched = [key for key, value in geometric_results.items()
+                      if np.ndim(value) == 0 and not np.isclose(value, tree_results[key], atol=1e-5)]
+        if mismatched:
+            print(f"  ❌ kd-tree and dense distances disagree on: {', '.join(mismatched)}")
+            return False
+        print("  ✅ kd-tree distance path matches dense path")
+        
         # Calculate grade
         grading_results = evaluator.calculate_grade(geometric_results)
         print(f"  ✅ Grading system working (Grade: {grading_results['letter_grade']}, Score: {grading_results['numerical_score']}%)")
@@ -158,13 +203,11 @@ def test_visualization():
         
         fig.update_layout(title="Test 3D Visualization")
         
-        # Save to HTML
-        test_file = "test_visualization.html"
-        fig.write_html(test_file)
+        # Render to HTML in memory (without the plotly.js bundle)
+        html = fig.to_html(include_plotlyjs=False)
         
-        if os.path.exists(test_file):
-            print(f"  ✅ Visualization working (saved to {test_file})")
-            os.remove(test_file)  # Clean up
+        if len(html) > 0:
+            print("  ✅ Visualization working")
             return True
         else:
             print("  ❌ Visualization failed")
@@ -248,12 +291,32 @@ def main():
     
     results = {}
     
-    # Run tests
+    # Run tests: imports first, then the independent tests concurrently
     results['Module Imports'] = test_imports()
-    results['Sample Model Creation'] = create_sample_models()
-    results['Evaluation System'] = test_evaluation_system()
-    results['Visualization'] = test_visualization()
-    results['File Operations'] = test_file_operations()
+    
+    tests = [
+        ('Sample Model Creation', create_sample_models),
+        ('Evaluation System', test_evaluation_system),
+        ('Visualization', test_visualization),
+        ('File Operations', test_file_operations),
+    ]
+    
+    # Each test's output is buffered and printed as a block when it finishes
+    stdout = sys.stdout
+    sys.stdout = buffered_stdout = _ThreadBufferedStdout(stdout)
+    try:
+        with ThreadPoolExecutor(max_workers=len(tests)) as executor:
+            futures = {executor.submit(buffered_stdout.run_buffered, func): name
+                       for name, func in tests}
+            outcomes = {}
+            for future in as_completed(futures):
+                outcomes[futures[future]], output = future.result()
+                stdout.write(output)
+    finally:
+        sys.stdout = stdout
+    
+    for name, _ in tests:
+        results[name] = outcomes[name]
     
     # Generate report
     generate_test_report(results)